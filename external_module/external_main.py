@@ -1,9 +1,15 @@
 import os
+import re
 import json
+import time
+import heapq
 import asyncio
+import itertools
 from datetime import datetime
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
 import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from contextlib import asynccontextmanager
@@ -13,6 +19,11 @@ API_URL = "https://api.hh.ru/vacancies"
 OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../final_folder")
 INTERVAL_HOURS = 12
 MAX_PAGES = 20
+# Минимальная пауза между любыми двумя запросами к hh.ru (общий бюджет всех заданий)
+REQUEST_DELAY_SECONDS = 5
+# Повторы при ошибках hh.ru
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 10
 # Параметры запроса к hh.ru
 AREA = 2
 PER_PAGE = 99
@@ -35,15 +46,176 @@ KEYWORDS = [
     'гбр охрана'
 ]
 
+# Задания сбора: регионы x набор ключевых слов, свой интервал и приоритет.
+# По умолчанию одно задание, повторяющее прежнее поведение. Свой список заданий
+# можно задать JSON-файлом в COLLECTOR_JOBS_FILE, например:
+# [
+#     {"name": "core", "areas": [2], "keywords": ["грузчик нагрузки"], "interval_hours": 1, "priority": 10},
+#     {"name": "long_tail", "areas": [1, 2], "keywords": ["кинолог охранник"], "interval_hours": 24, "max_pages": 5}
+# ]
+# Задания с большим priority первыми получают запросы из общего бюджета.
+JOBS_FILE = os.environ.get("COLLECTOR_JOBS_FILE")
+# Имя задания попадает в имя файла и метки метрик
+JOB_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+DEFAULT_JOBS = [
+    {
+        "name": "default",
+        "areas": [AREA],
+        "keywords": KEYWORDS,
+        "interval_hours": INTERVAL_HOURS,
+        "priority": 0,
+        "max_pages": MAX_PAGES
+    }
+]
+
+# Метрики Prometheus
+REQUEST_LATENCY = Histogram(
+    "collector_request_duration_seconds",
+    "HTTP request latency by endpoint.",
+    ["method", "endpoint", "status"]
+)
+PAGE_FETCH_LATENCY = Histogram(
+    "collector_page_fetch_duration_seconds",
+    "Latency of a single hh.ru page request.",
+    ["job", "group", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+PAGE_FETCH_RETRIES = Counter(
+    "collector_page_fetch_retries_total",
+    "Number of retried hh.ru page requests.",
+    ["job", "group", "reason"]
+)
+ITEMS_FETCHED = Counter(
+    "collector_items_fetched_total",
+    "Number of vacancies fetched from hh.ru.",
+    ["job", "group"]
+)
+RATE_LIMIT_WAIT_SECONDS = Counter(
+    "collector_rate_limit_wait_seconds_total",
+    "Time spent waiting between hh.ru requests.",
+    ["job", "reason"]
+)
+CRAWL_DURATION_SECONDS = Gauge(
+    "collector_crawl_duration_seconds",
+    "Duration of the last crawl of a job.",
+    ["job"]
+)
+CRAWL_LAST_SUCCESS = Gauge(
+    "collector_crawl_last_success_timestamp_seconds",
+    "Unix time of the last crawl of a job that fetched data.",
+    ["job"]
+)
+
 app = FastAPI()
 
-def save_vacancies_to_file(grouped_data: dict):
-    """Сохраняет сгруппированные данные в .txt файл"""
+class RateBudget:
+    """Общий для всех заданий лимит запросов к hh.ru.
+    
+    Запросы выдаются не чаще одного за min_interval секунд; из ожидающих
+    первым обслуживается запрос с наибольшим приоритетом.
+    """
+    
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._waiters = []
+        self._counter = itertools.count()
+        self._next_slot = 0.0
+        self._dispatcher = None
+    
+    async def acquire(self, priority: int = 0):
+        """Ждет своей очереди на запрос"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._counter), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+    
+    def defer(self, seconds: float):
+        """Откладывает все следующие запросы, например после ответа 429"""
+        self._next_slot = max(self._next_slot, asyncio.get_running_loop().time() + seconds)
+    
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            delay = self._next_slot - loop.time()
+            if delay > 0:
+                # После паузы заново выбираем запрос: мог прийти более приоритетный
+                await asyncio.sleep(delay)
+                continue
+            
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            future.set_result(None)
+            self._next_slot = loop.time() + self.min_interval
+
+RATE_BUDGET = RateBudget(REQUEST_DELAY_SECONDS)
+
+def load_jobs() -> list:
+    """Загружает задания сбора из COLLECTOR_JOBS_FILE или возвращает задания по умолчанию"""
+    jobs = DEFAULT_JOBS
+    if JOBS_FILE:
+        with open(JOBS_FILE, "r", encoding="utf-8") as f:
+            jobs = json.load(f)
+    
+    if not isinstance(jobs, list) or not jobs:
+        raise ValueError("Список заданий должен быть непустым JSON-массивом.")
+    
+    result = []
+    names = set()
+    for job in jobs:
+        if not isinstance(job, dict):
+            raise ValueError(f"Задание должно быть объектом: {job!r}.")
+        
+        name = job.get("name")
+        if not isinstance(name, str) or not JOB_NAME_PATTERN.fullmatch(name):
+            raise ValueError(f"Имя задания должно состоять из латинских букв, цифр, '_' и '-': {name!r}.")
+        if name in names:
+            raise ValueError(f"Имя задания повторяется: {name!r}.")
+        names.add(name)
+        
+        areas = job.get("areas", [AREA])
+        if not isinstance(areas, list) or not areas or not all(_is_positive_int(a) for a in areas):
+            raise ValueError(f"У задания {name} areas должен быть непустым списком ID регионов.")
+        
+        keywords = job.get("keywords")
+        if not isinstance(keywords, list) or not keywords \
+                or not all(isinstance(k, str) and k.strip() for k in keywords):
+            raise ValueError(f"У задания {name} keywords должен быть непустым списком строк.")
+        
+        interval_hours = job.get("interval_hours", INTERVAL_HOURS)
+        if isinstance(interval_hours, bool) or not isinstance(interval_hours, (int, float)) or interval_hours <= 0:
+            raise ValueError(f"У задания {name} interval_hours должен быть положительным числом.")
+        
+        max_pages = job.get("max_pages", MAX_PAGES)
+        if not _is_positive_int(max_pages):
+            raise ValueError(f"У задания {name} max_pages должен быть положительным целым числом.")
+        
+        priority = job.get("priority", 0)
+        if isinstance(priority, bool) or not isinstance(priority, int) or priority < 0:
+            raise ValueError(f"У задания {name} priority должен быть неотрицательным целым числом.")
+        
+        result.append({
+            "name": name,
+            "areas": areas,
+            "keywords": keywords,
+            "interval_hours": interval_hours,
+            "priority": priority,
+            "max_pages": max_pages
+        })
+    
+    return result
+
+def _is_positive_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+def save_vacancies_to_file(grouped_data: dict, job_name: str):
+    """Сохраняет сгруппированные данные задания в .txt файл"""
     if not os.path.exists(OUTPUT_FOLDER):
         os.makedirs(OUTPUT_FOLDER)
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"vacancies_{timestamp}.txt"
+    filename = f"vacancies_{job_name}_{timestamp}.txt"
     filepath = os.path.join(OUTPUT_FOLDER, filename)
     
     try:
@@ -53,43 +225,91 @@ def save_vacancies_to_file(grouped_data: dict):
     except Exception as e:
         print(f"[{datetime.now()}] Ошибка сохранения данных: {e}.")
 
-async def fetch_vacancies():
-    """Получает данные с API hh.ru и группирует по ролям"""
-    print(f"[{datetime.now()}] Получение данных из {API_URL}...")
+async def rate_limit_wait(job_name: str, seconds: float, reason: str):
+    """Ждет перед повтором запроса и учитывает время ожидания в метриках"""
+    await asyncio.sleep(seconds)
+    RATE_LIMIT_WAIT_SECONDS.labels(job=job_name, reason=reason).inc(seconds)
+
+async def fetch_page(client: httpx.AsyncClient, params: list, job: dict, group_label: str) -> dict:
+    """Запрашивает одну страницу вакансий, повторяя запрос при 429/5xx и сетевых ошибках"""
+    job_name = job["name"]
+    priority = job["priority"]
+    # После 429 ожидание в бюджете включает паузу от hh.ru и учитывается отдельно
+    wait_reason = "budget"
+    for attempt in range(MAX_RETRIES + 1):
+        wait_start = time.perf_counter()
+        await RATE_BUDGET.acquire(priority)
+        RATE_LIMIT_WAIT_SECONDS.labels(job=job_name, reason=wait_reason).inc(time.perf_counter() - wait_start)
+        wait_reason = "budget"
+        
+        start = time.perf_counter()
+        try:
+            response = await client.get(API_URL, params=params)
+        except httpx.TransportError:
+            PAGE_FETCH_LATENCY.labels(job=job_name, group=group_label, outcome="transport_error").observe(time.perf_counter() - start)
+            if attempt == MAX_RETRIES:
+                raise
+            PAGE_FETCH_RETRIES.labels(job=job_name, group=group_label, reason="transport_error").inc()
+            await rate_limit_wait(job_name, RETRY_BACKOFF_SECONDS * (attempt + 1), "backoff")
+            continue
+        
+        retryable = response.status_code == 429 or response.status_code >= 500
+        outcome = str(response.status_code)
+        PAGE_FETCH_LATENCY.labels(job=job_name, group=group_label, outcome=outcome).observe(time.perf_counter() - start)
+        
+        if retryable and attempt < MAX_RETRIES:
+            PAGE_FETCH_RETRIES.labels(job=job_name, group=group_label, reason=outcome).inc()
+            if response.status_code == 429:
+                # hh.ru может подсказать, сколько ждать; пауза касается всех заданий
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else RETRY_BACKOFF_SECONDS * (attempt + 1)
+                RATE_BUDGET.defer(delay)
+                wait_reason = "rate_limited"
+            else:
+                await rate_limit_wait(job_name, RETRY_BACKOFF_SECONDS * (attempt + 1), "backoff")
+            continue
+        
+        response.raise_for_status()
+        return response.json()
+
+async def fetch_vacancies(job: dict):
+    """Получает данные задания с API hh.ru и группирует по регионам и ролям"""
+    job_name = job["name"]
+    print(f"[{datetime.now()}] Задание {job_name}: получение данных из {API_URL}...")
+    crawl_start = time.perf_counter()
     
     # Словарь для хранения сгруппированных данных
     grouped_data = {}
     total_count = 0
     
     async with httpx.AsyncClient() as client:
-        for group_index, vacancy_keywords in enumerate(KEYWORDS):
-            group_name = f"group_{group_index+1}_keywords_{vacancy_keywords.replace(' ', '_')}"
+        for group_index, (area, vacancy_keywords) in enumerate(itertools.product(job["areas"], job["keywords"])):
+            group_name = f"group_{group_index+1}_area_{area}_keywords_{vacancy_keywords.replace(' ', '_')}"
+            # Метка для метрик не зависит от порядка групп в задании
+            group_label = f"area_{area}_keywords_{vacancy_keywords.replace(' ', '_')}"
             print(f"[{datetime.now()}] Обработка группы {group_name}...")
             
             group_items = []
             
-            for page in range(0, MAX_PAGES):
+            for page in range(0, job["max_pages"]):
                 try:
                     params = [
-                        ("area", AREA),
+                        ("area", area),
                         ("per_page", PER_PAGE),
                         ("page", page),
                         ("text", vacancy_keywords)
                     ]
                     
-                    # Ждем между запросами
-                    await asyncio.sleep(5)
-                    
-                    response = await client.get(API_URL, params=params)
-                    response.raise_for_status()
-                    data = response.json()
+                    data = await fetch_page(client, params, job, group_label)
                     
                     items = data.get("items", [])
+                    ITEMS_FETCHED.labels(job=job_name, group=group_label).inc(len(items))
                     
                     # Добавляем вакансии в группу
                     for item in items:
                         # Добавляем информацию о группе ролей в каждую вакансию
                         item["_group_keywords"] = vacancy_keywords
+                        item["_group_area"] = area
                         item["_group_name"] = group_name
                     
                     group_items.extend(items)
@@ -107,6 +327,7 @@ async def fetch_vacancies():
             
             # Сохраняем группу в общий словарь
             grouped_data[group_name] = {
+                "area": area,
                 "keywords": vacancy_keywords,
                 "vacancies": group_items,
                 "count": len(group_items)
@@ -116,10 +337,14 @@ async def fetch_vacancies():
             
             print(f"[{datetime.now()}] Группа {group_name} обработана, найдено {len(group_items)} вакансий.")
     
+    CRAWL_DURATION_SECONDS.labels(job=job_name).set(time.perf_counter() - crawl_start)
+    
     if grouped_data:
         # Добавляем общую информацию
         result_data = {
             "metadata": {
+                "job": job_name,
+                "priority": job["priority"],
                 "fetched_at": datetime.now().isoformat(),
                 "total_vacancies": total_count,
                 "total_groups": len(grouped_data)
@@ -127,24 +352,29 @@ async def fetch_vacancies():
             "groups": grouped_data
         }
         
-        save_vacancies_to_file(result_data)
+        save_vacancies_to_file(result_data, job_name)
+        if total_count:
+            CRAWL_LAST_SUCCESS.labels(job=job_name).set(time.time())
     else:
-        print(f"[{datetime.now()}] Данные не были получены.")
+        print(f"[{datetime.now()}] Задание {job_name}: данные не были получены.")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(
-        fetch_vacancies,
-        trigger=IntervalTrigger(hours=INTERVAL_HOURS),
-        id="fetch_vacancies_job",
-        name="Fetch vacancies every 12 hours",
-        replace_existing=True,
-    )
+    for job in load_jobs():
+        scheduler.add_job(
+            fetch_vacancies,
+            trigger=IntervalTrigger(hours=job["interval_hours"]),
+            args=[job],
+            id=f"fetch_vacancies_{job['name']}",
+            name=f"Fetch vacancies for {job['name']} every {job['interval_hours']} hours",
+            replace_existing=True,
+            # Первый сбор сразу после запуска
+            next_run_time=datetime.now(),
+        )
+        print(f"[{datetime.now()}] Задание {job['name']}: данные собираются каждые {job['interval_hours']} часов, приоритет {job['priority']}.")
     scheduler.start()
-    print(f"[{datetime.now()}] Менеджер запущен. Данные собираются каждые {INTERVAL_HOURS} часов.")
-
-    asyncio.create_task(fetch_vacancies())
+    print(f"[{datetime.now()}] Менеджер запущен.")
     
     yield
     
@@ -153,10 +383,31 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(lifespan=lifespan)
 
+@app.middleware("http")
+async def track_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            endpoint=endpoint,
+            status=str(status)
+        ).observe(time.perf_counter() - start)
+
 @app.get("/")
 async def root():
     return {"message": "Приложение работает."}
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("external_main:app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file
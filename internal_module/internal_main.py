@@ -1,21 +1,39 @@
 import os
-from typing import List, Dict, Optional, Any
-from fastapi import FastAPI, HTTPException
+import time
+import threading
+from typing import List, Dict, Optional, Any, Callable
+from fastapi import FastAPI, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-import pandas as pd
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from fastapi.encoders import jsonable_encoder
 import numpy as np
 
 # Import parser module
+from internal_module import parser, shared_dataset
 from internal_module.parser import (
     load_data,
-    process_salary,
-    filter_salary_outliers,
+    resolve_data_file,
     parse_vacancies_for_role,
+    parse_all_vacancies,
     ROLES_CONFIG,
-    EXPERIENCE_MAP
+    EXPERIENCE_MAP,
+    OUTLIER_HIGH_MULTIPLIER,
+    OUTLIER_LOW_DIVISOR
 )
+from internal_module.metrics import (
+    CONTENT_TYPE_LATEST,
+    REQUEST_LATENCY,
+    SNAPSHOT_LOAD_SECONDS,
+    SNAPSHOT_SIZE_BYTES,
+    SNAPSHOT_VACANCIES,
+    mark_worker_dead,
+    render_metrics,
+    stage_timer
+)
+from internal_module.profiling import is_profiling_allowed, profile_call, save_profile
+from internal_module.warm_state import code_fingerprint, load_warm_state, save_warm_state, snapshot_fingerprint
+from internal_module.shared_dataset import SHARED_DATASET_DIR, SharedDataset, ensure_shared_dataset
 
 app = FastAPI()
 
@@ -34,25 +52,220 @@ frontend_path = os.path.join(os.path.dirname(__file__), "frontend/dist")
 
 VACANCIES = []
 
+# Memory-mapped dataset shared by all workers (multi-worker mode, see shared_dataset)
+SHARED_DATASET: Optional[SharedDataset] = None
+
+# Loading state reported by the readiness endpoint
+LOAD_STATE = {
+    "status": "loading",
+    "vacancies": 0,
+    "warm_state_loaded": False
+}
+
+# Stats payloads keyed by request parameters, restored from / persisted to the warm state file
+STATS_CACHE: Dict[str, Any] = {}
+SNAPSHOT_FINGERPRINT: Optional[Dict[str, Any]] = None
+
+@app.middleware("http")
+async def track_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Use the route template so that path parameters do not explode label cardinality
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            endpoint=endpoint,
+            status=str(status)
+        ).observe(time.perf_counter() - start)
+
 @app.on_event("startup")
 def startup_event():
-    global VACANCIES
-    VACANCIES = load_data()
-    print(f"Loaded {len(VACANCIES)} vacancies")
+    global SNAPSHOT_FINGERPRINT
+    # Serve cached aggregates right away if they were built from the same snapshot
+    data_file = resolve_data_file()
+    SNAPSHOT_FINGERPRINT = snapshot_fingerprint(data_file) if data_file else None
+    if SNAPSHOT_FINGERPRINT is not None:
+        # Cached aggregates also depend on the role mapping and the code that computed them
+        SNAPSHOT_FINGERPRINT["roles"] = ROLES_CONFIG
+        SNAPSHOT_FINGERPRINT["outliers"] = [OUTLIER_HIGH_MULTIPLIER, OUTLIER_LOW_DIVISOR]
+        SNAPSHOT_FINGERPRINT["code"] = code_fingerprint([__file__, parser.__file__, shared_dataset.__file__])
+    STATS_CACHE.update(load_warm_state(SNAPSHOT_FINGERPRINT))
+    LOAD_STATE["warm_state_loaded"] = bool(STATS_CACHE)
+    if STATS_CACHE:
+        print(f"Restored {len(STATS_CACHE)} cached aggregates from warm state")
+    
+    # Parse the full snapshot in the background so that the service accepts requests immediately
+    threading.Thread(target=load_dataset, name="dataset-loader", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if LOAD_STATE["status"] == "ready":
+        save_warm_state(SNAPSHOT_FINGERPRINT, STATS_CACHE)
+    mark_worker_dead()
+
+def load_dataset():
+    """
+    Load vacancies, precompute aggregates for every role and persist them as warm state.
+    
+    In multi-worker mode (SHARED_DATASET_DIR is set) the worker attaches to the
+    shared dataset instead of keeping its own copy; one worker builds it if needed
+    while the others keep reporting "loading".
+    """
+    global VACANCIES, SHARED_DATASET
+    try:
+        start = time.perf_counter()
+        if SHARED_DATASET_DIR:
+            SHARED_DATASET = ensure_shared_dataset(SHARED_DATASET_DIR)
+            vacancies_count = len(SHARED_DATASET)
+            SNAPSHOT_SIZE_BYTES.set(SHARED_DATASET.nbytes())
+            print(f"Attached to shared dataset with {vacancies_count} vacancies")
+        else:
+            VACANCIES = load_data()
+            vacancies_count = len(VACANCIES)
+            data_file = resolve_data_file()
+            if data_file:
+                SNAPSHOT_SIZE_BYTES.set(os.path.getsize(data_file))
+            print(f"Loaded {vacancies_count} vacancies")
+        SNAPSHOT_LOAD_SECONDS.set(time.perf_counter() - start)
+        SNAPSHOT_VACANCIES.set(vacancies_count)
+        
+    except Exception as e:
+        LOAD_STATE["status"] = "failed"
+        print(f"Failed to load vacancies: {e}")
+        return
+    
+    LOAD_STATE["vacancies"] = vacancies_count
+    LOAD_STATE["status"] = "ready"
+    
+    cached_count = len(STATS_CACHE)
+    warm_up_cache()
+    if len(STATS_CACHE) > cached_count and save_warm_state(SNAPSHOT_FINGERPRINT, STATS_CACHE):
+        print(f"Saved {len(STATS_CACHE)} cached aggregates to warm state")
+
+def warm_up_cache():
+    """
+    Precompute stats for all roles and outlier settings that are not cached yet.
+    
+    A failing computation is logged and skipped; the request for it is then
+    computed (and fails) on demand, as it would without warm-up.
+    """
+    jobs = []
+    for filter_outliers in (True, False):
+        for role_index in range(len(ROLES_CONFIG)):
+            jobs.append((
+                f"stats:{role_index}:{filter_outliers}",
+                lambda role_index=role_index, filter_outliers=filter_outliers: compute_role_stats(role_index, filter_outliers)
+            ))
+        jobs.append((
+            f"overall:{filter_outliers}",
+            lambda filter_outliers=filter_outliers: compute_overall_stats(filter_outliers)
+        ))
+    
+    for key, compute in jobs:
+        try:
+            cached_stats(key, compute)
+        except Exception as e:
+            print(f"Failed to precompute {key}: {e!r}")
+
+def ensure_ready():
+    """
+    Reject requests that need the full dataset while it is still loading.
+    """
+    if LOAD_STATE["status"] != "ready":
+        raise HTTPException(status_code=503, detail=f"Vacancies are {LOAD_STATE['status']}")
+
+def cached_stats(key: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Return a cached stats payload, computing and caching it on a miss.
+    
+    The dataset is immutable once loaded, so cached payloads never go stale.
+    """
+    stats = STATS_CACHE.get(key)
+    if stats is None:
+        ensure_ready()
+        stats = jsonable_encoder(compute())
+        STATS_CACHE[key] = stats
+    return stats
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    status_code = 200 if LOAD_STATE["status"] == "ready" else 503
+    return JSONResponse(content=LOAD_STATE, status_code=status_code)
+
+@app.get("/metrics")
+def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/api/roles")
 def get_roles():
     return ROLES_CONFIG
 
 @app.get("/api/stats/{role_index}")
-def get_stats(role_index: int, filter_outliers: bool = True):
+def get_stats(role_index: int, filter_outliers: bool = True, profile: bool = False,
+              x_profile_token: Optional[str] = Header(None)):
     """
     Get statistics for a specific role.
     
     Args:
         role_index: Index of the role in ROLES_CONFIG.
         filter_outliers: Whether to filter vacancies with salaries 3x higher than median.
+        profile: Return a sampling profile of the request instead of the stats
+                 (requires the X-Profile-Token header matching PROFILING_TOKEN).
+    """
+    if role_index < 0 or role_index >= len(ROLES_CONFIG):
+        raise HTTPException(status_code=404, detail="Role not found")
+    
+    if profile:
+        return profiled_response(
+            f"stats_{role_index}",
+            x_profile_token,
+            lambda: serialize_stats(compute_role_stats(role_index, filter_outliers))
+        )
+    return serialize_stats(cached_stats(
+        f"stats:{role_index}:{filter_outliers}",
+        lambda: compute_role_stats(role_index, filter_outliers)
+    ))
+
+def profiled_response(name: str, token: Optional[str], handler: Callable[[], Any]) -> PlainTextResponse:
+    """
+    Run a handler under the sampling profiler and return the collapsed stacks.
+    
+    The profile is also stored in PROFILE_DIR when it is configured.
+    """
+    if not is_profiling_allowed(token):
+        raise HTTPException(status_code=403, detail="Profiling is not allowed")
+    ensure_ready()
+    
+    _, collapsed = profile_call(handler)
+    headers = {}
+    profile_path = save_profile(name, collapsed)
+    if profile_path:
+        headers["X-Profile-Path"] = profile_path
+    return PlainTextResponse(collapsed, headers=headers)
+
+def serialize_stats(stats: Dict[str, Any]) -> JSONResponse:
     """
+    Serialize a stats payload explicitly so that its cost is measured separately.
+    """
+    with stage_timer("serialization"):
+        return JSONResponse(content=jsonable_encoder(stats))
+
+def compute_role_stats(role_index: int, filter_outliers: bool) -> Dict[str, Any]:
+    """
+    Compute statistics for a specific role (see get_stats).
+    """
+    import pandas as pd  # Imported lazily to keep service startup fast
+    
     if role_index < 0 or role_index >= len(ROLES_CONFIG):
         raise HTTPException(status_code=404, detail="Role not found")
     
@@ -60,12 +273,15 @@ def get_stats(role_index: int, filter_outliers: bool = True):
     target_ids = set(map(str, role_config["ids"]))  # IDs in data are likely strings
     
     # Use parser module to process vacancies with outlier filtering
-    parsed_data = parse_vacancies_for_role(
-        VACANCIES, 
-        target_ids, 
-        filter_outliers=filter_outliers,
-        outlier_multiplier=3
-    )
+    if SHARED_DATASET is not None:
+        parsed_data = SHARED_DATASET.parse_role(target_ids, filter_outliers=filter_outliers)
+    else:
+        parsed_data = parse_vacancies_for_role(
+            VACANCIES, 
+            target_ids, 
+            filter_outliers=filter_outliers,
+            outlier_multiplier=3
+        )
     
     salary_values = parsed_data["salary_values"]
     pulkovo_salaries = parsed_data["pulkovo_salaries"]
@@ -79,177 +295,159 @@ def get_stats(role_index: int, filter_outliers: bool = True):
     if not salary_values:
         return {"error": "No data found for this role"}
         
-    # Aggregate bubble chart data
-    bubble_df = pd.DataFrame(bubble_data)
-    if not bubble_df.empty:
-        # Group by salary and experience, count
-        bubble_agg = bubble_df.groupby(['salary', 'experience', 'experience_label']).size().reset_index(name='count')
-        # Scale count for bubble size if needed, or just pass count
-        bubble_data_agg = bubble_agg.to_dict(orient='records')
-    else:
-        bubble_data_agg = []
+    with stage_timer("aggregation"):
+        # Aggregate bubble chart data
+        bubble_df = pd.DataFrame(bubble_data)
+        if not bubble_df.empty:
+            # Group by salary and experience, count
+            bubble_agg = bubble_df.groupby(['salary', 'experience', 'experience_label']).size().reset_index(name='count')
+            # Scale count for bubble size if needed, or just pass count
+            bubble_data_agg = bubble_agg.to_dict(orient='records')
+        else:
+            bubble_data_agg = []
 
-    # Metrics
-    metrics = {
-        "min": float(np.min(salary_values)),
-        "max": float(np.max(salary_values)),
-        "avg": float(np.mean(salary_values)),
-        "median": float(np.median(salary_values)),
-        "count": len(salary_values)
-    }
+        # Metrics
+        metrics = {
+            "min": float(np.min(salary_values)),
+            "max": float(np.max(salary_values)),
+            "avg": float(np.mean(salary_values)),
+            "median": float(np.median(salary_values)),
+            "count": len(salary_values)
+        }
     
-    # Pulkovo vs Market
-    pulkovo_avg = float(np.mean(pulkovo_salaries)) if pulkovo_salaries else 0
-    market_avg = float(np.mean(market_salaries)) if market_salaries else 0
+        # Pulkovo vs Market
+        pulkovo_avg = float(np.mean(pulkovo_salaries)) if pulkovo_salaries else 0
+        market_avg = float(np.mean(market_salaries)) if market_salaries else 0
     
-    comparison = {
-        "pulkovo": pulkovo_avg,
-        "market": market_avg
-    }
+        comparison = {
+            "pulkovo": pulkovo_avg,
+            "market": market_avg
+        }
 
-    # Distributions
-    # Salary histogram (simple bins)
-    hist, bin_edges = np.histogram(salary_values, bins=8)
-    salary_dist = []
-    for i in range(len(hist)):
-        salary_dist.append({
-            "range": f"{int(bin_edges[i])} - {int(bin_edges[i+1])}",
-            "count": int(hist[i])
-        })
+        # Distributions
+        # Salary histogram (simple bins)
+        hist, bin_edges = np.histogram(salary_values, bins=8)
+        salary_dist = []
+        for i in range(len(hist)):
+            salary_dist.append({
+                "range": f"{int(bin_edges[i])} - {int(bin_edges[i+1])}",
+                "count": int(hist[i])
+            })
         
-    # Experience distribution
-    exp_series = pd.Series(experience_values)
-    exp_counts = exp_series.value_counts().to_dict()
-    experience_dist = [{"name": k, "value": v} for k, v in exp_counts.items()]
+        # Experience distribution
+        exp_series = pd.Series(experience_values)
+        exp_counts = exp_series.value_counts().to_dict()
+        experience_dist = [{"name": k, "value": v} for k, v in exp_counts.items()]
     
-    # Employment distribution
-    emp_series = pd.Series(employment_values)
-    emp_counts = emp_series.value_counts().to_dict()
-    employment_dist = [{"name": k, "count": v} for k, v in emp_counts.items()]
+        # Employment distribution
+        emp_series = pd.Series(employment_values)
+        emp_counts = emp_series.value_counts().to_dict()
+        employment_dist = [{"name": k, "count": v} for k, v in emp_counts.items()]
     
-    # Schedule distribution
-    sched_series = pd.Series(schedule_values)
-    sched_counts = sched_series.value_counts().to_dict()
-    schedule_dist = [{"name": k, "count": v} for k, v in sched_counts.items()]
+        # Schedule distribution
+        sched_series = pd.Series(schedule_values)
+        sched_counts = sched_series.value_counts().to_dict()
+        schedule_dist = [{"name": k, "count": v} for k, v in sched_counts.items()]
     
-    return {
-        "role": role_config["name"],
-        "metrics": metrics,
-        "comparison": comparison,
-        "bubble_data": bubble_data_agg,
-        "salary_dist": salary_dist,
-        "experience_dist": experience_dist,
-        "employment_dist": employment_dist,
-        "schedule_dist": schedule_dist,
-        "outliers_filtered": filter_outliers,
-        "filter_stats": {
-            "total_before_filter": filter_stats["total_before_filter"],
-            "filtered_out_count": filter_stats["filtered_count"],
-            "total_after_filter": len(salary_values),
-            "median_salary_for_filter": filter_stats["median_salary"],
-            "threshold_salary": filter_stats["threshold_salary"]
+        return {
+            "role": role_config["name"],
+            "metrics": metrics,
+            "comparison": comparison,
+            "bubble_data": bubble_data_agg,
+            "salary_dist": salary_dist,
+            "experience_dist": experience_dist,
+            "employment_dist": employment_dist,
+            "schedule_dist": schedule_dist,
+            "outliers_filtered": filter_outliers,
+            "filter_stats": {
+                "total_before_filter": filter_stats["total_before_filter"],
+                "filtered_out_count": filter_stats["filtered_count"],
+                "total_after_filter": len(salary_values),
+                "median_salary_for_filter": filter_stats["median_salary"],
+                "threshold_salary": filter_stats["threshold_salary"]
+            }
         }
-    }
 
 @app.get("/api/overall-stats")
-def get_overall_stats(filter_outliers: bool = True):
+def get_overall_stats(filter_outliers: bool = True, profile: bool = False,
+                      x_profile_token: Optional[str] = Header(None)):
     """
     Get statistics for ALL vacancies in the txt file.
     
     Args:
         filter_outliers: Whether to filter vacancies with too high or too low salaries
                         (salaries > 3x median or < median/3).
+        profile: Return a sampling profile of the request instead of the stats
+                 (requires the X-Profile-Token header matching PROFILING_TOKEN).
     """
-    if not VACANCIES:
-        return {"error": "No vacancies loaded"}
-    
-    # Apply salary outlier filtering if enabled
-    vacancies_to_process = VACANCIES
-    filter_stats = {
-        "total_before_filter": len(VACANCIES),
-        "filtered_high_count": 0,
-        "filtered_low_count": 0,
-        "filtered_total_count": 0,
-        "median_salary": None,
-        "high_threshold": None,
-        "low_threshold": None
-    }
-    
-    if filter_outliers:
-        vacancies_to_process, outlier_stats = filter_salary_outliers(
-            VACANCIES, 
-            return_stats=True
+    if profile:
+        return profiled_response(
+            "overall_stats",
+            x_profile_token,
+            lambda: serialize_stats(compute_overall_stats(filter_outliers))
         )
-        filter_stats["filtered_high_count"] = outlier_stats["filtered_high_count"]
-        filter_stats["filtered_low_count"] = outlier_stats["filtered_low_count"]
-        filter_stats["filtered_total_count"] = outlier_stats["filtered_total_count"]
-        filter_stats["median_salary"] = outlier_stats["median"]
-        filter_stats["high_threshold"] = outlier_stats["high_threshold"]
-        filter_stats["low_threshold"] = outlier_stats["low_threshold"]
+    return serialize_stats(cached_stats(
+        f"overall:{filter_outliers}",
+        lambda: compute_overall_stats(filter_outliers)
+    ))
+
+def compute_overall_stats(filter_outliers: bool) -> Dict[str, Any]:
+    """
+    Compute statistics for all vacancies (see get_overall_stats).
+    """
+    import pandas as pd  # Imported lazily to keep service startup fast
     
-    salary_values = []
-    experience_values = []
-    employment_values = []
-    schedule_values = []
+    if SHARED_DATASET is not None:
+        parsed_data = SHARED_DATASET.parse_all(filter_outliers=filter_outliers)
+    else:
+        parsed_data = parse_all_vacancies(VACANCIES, filter_outliers=filter_outliers)
     
-    for v in vacancies_to_process:
-        salary_info = process_salary(v)
-        if salary_info:
-            salary_values.append(salary_info["avg"])
-        
-        # Experience
-        exp_obj = v.get("experience", {})
-        exp_name = exp_obj.get("name", "Не указано")
-        experience_values.append(exp_name)
-        
-        # Employment type
-        employment_obj = v.get("employment", {})
-        employment_name = employment_obj.get("name", "Не указано")
-        employment_values.append(employment_name)
-        
-        # Schedule type
-        schedule_obj = v.get("schedule", {})
-        schedule_name = schedule_obj.get("name", "Не указано")
-        schedule_values.append(schedule_name)
+    if not parsed_data["filter_stats"]["total_before_filter"]:
+        return {"error": "No vacancies loaded"}
     
-    # Total count of vacancies
-    total_count = len(vacancies_to_process)
+    salary_values = parsed_data["salary_values"]
+    experience_values = parsed_data["experience_values"]
+    employment_values = parsed_data["employment_values"]
+    schedule_values = parsed_data["schedule_values"]
+    total_count = parsed_data["total_count"]
+    filter_stats = parsed_data["filter_stats"]
     
-    # Salary metrics (only for vacancies with salary after filtering)
-    metrics = {}
-    if salary_values:
-        metrics = {
-            "min": float(np.min(salary_values)),
-            "max": float(np.max(salary_values)),
-            "avg": float(np.mean(salary_values)),
-            "median": float(np.median(salary_values)),
-            "with_salary_count": len(salary_values)
-        }
+    with stage_timer("aggregation"):
+        # Salary metrics (only for vacancies with salary after filtering)
+        metrics = {}
+        if salary_values:
+            metrics = {
+                "min": float(np.min(salary_values)),
+                "max": float(np.max(salary_values)),
+                "avg": float(np.mean(salary_values)),
+                "median": float(np.median(salary_values)),
+                "with_salary_count": len(salary_values)
+            }
     
-    # Experience distribution
-    exp_series = pd.Series(experience_values)
-    exp_counts = exp_series.value_counts().to_dict()
-    experience_dist = [{"name": k, "value": v} for k, v in exp_counts.items()]
+        # Experience distribution
+        exp_series = pd.Series(experience_values)
+        exp_counts = exp_series.value_counts().to_dict()
+        experience_dist = [{"name": k, "value": v} for k, v in exp_counts.items()]
     
-    # Employment distribution
-    emp_series = pd.Series(employment_values)
-    emp_counts = emp_series.value_counts().to_dict()
-    employment_dist = [{"name": k, "count": v} for k, v in emp_counts.items()]
+        # Employment distribution
+        emp_series = pd.Series(employment_values)
+        emp_counts = emp_series.value_counts().to_dict()
+        employment_dist = [{"name": k, "count": v} for k, v in emp_counts.items()]
     
-    # Schedule distribution
-    sched_series = pd.Series(schedule_values)
-    sched_counts = sched_series.value_counts().to_dict()
-    schedule_dist = [{"name": k, "count": v} for k, v in sched_counts.items()]
+        # Schedule distribution
+        sched_series = pd.Series(schedule_values)
+        sched_counts = sched_series.value_counts().to_dict()
+        schedule_dist = [{"name": k, "count": v} for k, v in sched_counts.items()]
     
-    return {
-        "total_count": total_count,
-        "metrics": metrics,
-        "experience_dist": experience_dist,
-        "employment_dist": employment_dist,
-        "schedule_dist": schedule_dist,
-        "outliers_filtered": filter_outliers,
-        "filter_stats": filter_stats
-    }
+        return {
+            "total_count": total_count,
+            "metrics": metrics,
+            "experience_dist": experience_dist,
+            "employment_dist": employment_dist,
+            "schedule_dist": schedule_dist,
+            "outliers_filtered": filter_outliers,
+            "filter_stats": filter_stats
+        }
 
 @app.get("/dashboard")
 async def dashboard():
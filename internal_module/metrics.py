@@ -0,0 +1,91 @@
+"""
+Metrics module for the dashboard service.
+Contains Prometheus metric definitions and helpers for timing request handling stages.
+
+In multi-worker mode PROMETHEUS_MULTIPROC_DIR must point to an empty directory
+before the workers start; each worker then writes its samples there and
+/metrics aggregates them across all workers.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess
+
+
+# Shared metrics directory of all workers (multi-worker mode only)
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+# Request latency per endpoint (route template, not the raw path)
+REQUEST_LATENCY = Histogram(
+    "dashboard_request_duration_seconds",
+    "HTTP request latency by endpoint.",
+    ["method", "endpoint", "status"]
+)
+
+# Timings of individual stages inside stats computation
+STAGE_LATENCY = Histogram(
+    "dashboard_stats_stage_duration_seconds",
+    "Duration of stats computation stages.",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+# Snapshot loading
+SNAPSHOT_LOAD_SECONDS = Gauge(
+    "dashboard_snapshot_load_duration_seconds",
+    "Time spent loading the vacancies snapshot on startup.",
+    multiprocess_mode="livemax"
+)
+SNAPSHOT_SIZE_BYTES = Gauge(
+    "dashboard_snapshot_size_bytes",
+    "Size of the loaded vacancies snapshot: the JSON file, or the mapped columns in multi-worker mode.",
+    multiprocess_mode="livemax"
+)
+SNAPSHOT_VACANCIES = Gauge(
+    "dashboard_snapshot_vacancies",
+    "Number of vacancies in the loaded snapshot.",
+    multiprocess_mode="livemax"
+)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Measure the duration of a stats computation stage.
+
+    Args:
+        stage: Stage name used as the metric label.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> bytes:
+    """
+    Render all registered metrics in the Prometheus text format.
+
+    In multi-worker mode the metrics of all live workers are aggregated.
+
+    Returns:
+        Encoded metrics payload.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def mark_worker_dead() -> None:
+    """
+    Drop the live gauges of the current worker in multi-worker mode.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
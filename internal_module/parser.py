@@ -4,9 +4,11 @@ Contains functions for loading, parsing and filtering vacancy data.
 """
 import json
 import os
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import numpy as np
 
+from internal_module.metrics import stage_timer
+
 
 # Data file path
 DATA_FILE = os.path.join(os.path.dirname(__file__), "../final_folder/vacancies_20260125_144856.txt")
@@ -41,6 +43,38 @@ EXPERIENCE_MAP = {
     "moreThan6": 8
 }
 
+# Employer ID of Pulkovo airport
+PULKOVO_EMPLOYER_ID = "666661"
+
+# Defaults for missing vacancy attributes
+DEFAULT_EXPERIENCE_ID = "noExperience"
+DEFAULT_EXPERIENCE_LABEL = "Нет опыта"
+UNSPECIFIED_LABEL = "Не указано"
+
+# Salary outlier thresholds relative to the median
+OUTLIER_HIGH_MULTIPLIER = 3
+OUTLIER_LOW_DIVISOR = 5
+
+
+def resolve_data_file(file_path: Optional[str] = None) -> Optional[str]:
+    """
+    Find the vacancy data file that load_data reads.
+    
+    Args:
+        file_path: Optional path to the data file. Uses default if not provided.
+        
+    Returns:
+        Path to the existing data file, or None if neither it nor the fallback exists.
+    """
+    target_file = file_path or DATA_FILE
+    
+    if os.path.exists(target_file):
+        return target_file
+    # Try absolute path as fallback
+    if os.path.exists("/workspace/final_folder/vacancies_20260125_144856.txt"):
+        return "/workspace/final_folder/vacancies_20260125_144856.txt"
+    return None
+
 
 def load_data(file_path: Optional[str] = None) -> List[Dict[str, Any]]:
     """
@@ -52,13 +86,9 @@ def load_data(file_path: Optional[str] = None) -> List[Dict[str, Any]]:
     Returns:
         List of vacancy items.
     """
-    target_file = file_path or DATA_FILE
+    target_file = resolve_data_file(file_path)
     
-    if not os.path.exists(target_file):
-        # Try absolute path as fallback
-        if os.path.exists("/workspace/final_folder/vacancies_20260125_144856.txt"):
-            with open("/workspace/final_folder/vacancies_20260125_144856.txt", "r", encoding="utf-8") as f:
-                return json.load(f).get("items", [])
+    if target_file is None:
         return []
     
     with open(target_file, "r", encoding="utf-8") as f:
@@ -158,9 +188,42 @@ def calculate_salary_median(vacancies: List[Dict[str, Any]]) -> Optional[float]:
     
     return float(np.median(salaries))
 
+def salary_outlier_thresholds(salaries: Any,
+                              high_multiplier: float = OUTLIER_HIGH_MULTIPLIER,
+                              low_divisor: float = OUTLIER_LOW_DIVISOR) -> Tuple[float, float, float]:
+    """
+    Calculate the median salary and outlier thresholds.
+    
+    Args:
+        salaries: Non-empty sequence or array of salary values.
+        high_multiplier: Upper threshold multiplier relative to median.
+        low_divisor: Lower threshold divisor relative to median.
+        
+    Returns:
+        Tuple of (median, high_threshold, low_threshold).
+    """
+    median_salary = float(np.median(salaries))
+    return median_salary, median_salary * high_multiplier, median_salary / low_divisor
+
+
+def salary_outlier_flags(salary: Any, high_threshold: float, low_threshold: float) -> Tuple[Any, Any]:
+    """
+    Classify salaries as high or low outliers.
+    
+    Works both for a single salary and elementwise for a numpy array.
+    A salary above the high threshold is never counted as a low outlier.
+    
+    Returns:
+        Tuple of (is_high, is_low).
+    """
+    is_high = salary > high_threshold
+    is_low = (salary < low_threshold) & (salary <= high_threshold)
+    return is_high, is_low
+
+
 def filter_salary_outliers(vacancies: List[Dict[str, Any]], 
-                           high_multiplier: float = 3,
-                           low_divisor: float = 5,
+                           high_multiplier: float = OUTLIER_HIGH_MULTIPLIER,
+                           low_divisor: float = OUTLIER_LOW_DIVISOR,
                            return_stats: bool = False) -> Any:
     """
     Filter out vacancies with salaries that are too high or too low compared to median.
@@ -208,18 +271,19 @@ def filter_salary_outliers(vacancies: List[Dict[str, Any]],
     
     # Calculate median and thresholds
     salary_values = [s for _, s in salaries_with_vacancies]
-    median_salary = float(np.median(salary_values))
-    high_threshold = median_salary * high_multiplier
-    low_threshold = median_salary / low_divisor
+    median_salary, high_threshold, low_threshold = salary_outlier_thresholds(
+        salary_values, high_multiplier, low_divisor
+    )
     
     # Filter out high and low outliers
     filtered = []
     filtered_high_count = 0
     filtered_low_count = 0
     for v, salary in salaries_with_vacancies:
-        if salary > high_threshold:
+        is_high, is_low = salary_outlier_flags(salary, high_threshold, low_threshold)
+        if is_high:
             filtered_high_count += 1
-        elif salary < low_threshold:
+        elif is_low:
             filtered_low_count += 1
         else:
             filtered.append(v)
@@ -261,7 +325,8 @@ def parse_vacancies_for_role(vacancies: List[Dict[str, Any]],
         Includes 'filter_stats' with counts before/after filtering.
     """
     # Filter by role
-    role_vacancies = filter_vacancies_by_role(vacancies, role_ids)
+    with stage_timer("role_filter"):
+        role_vacancies = filter_vacancies_by_role(vacancies, role_ids)
     
     # Track filtering statistics
     filter_stats = {
@@ -273,9 +338,10 @@ def parse_vacancies_for_role(vacancies: List[Dict[str, Any]],
     
     # Optionally filter salary outliers (both high and low)
     if filter_outliers:
-        role_vacancies, outlier_stats = filter_salary_outliers(
-            role_vacancies, return_stats=True
-        )
+        with stage_timer("outlier_filter"):
+            role_vacancies, outlier_stats = filter_salary_outliers(
+                role_vacancies, return_stats=True
+            )
         filter_stats["filtered_count"] = outlier_stats["filtered_total_count"]
         filter_stats["median_salary"] = outlier_stats["median"]
         filter_stats["threshold_salary"] = outlier_stats["high_threshold"]
@@ -290,47 +356,48 @@ def parse_vacancies_for_role(vacancies: List[Dict[str, Any]],
     schedule_values = []
     processed_vacancies = []
     
-    for v in role_vacancies:
-        salary_info = process_salary(v)
-        if not salary_info:
-            continue
+    with stage_timer("extraction"):
+        for v in role_vacancies:
+            salary_info = process_salary(v)
+            if not salary_info:
+                continue
             
-        avg_salary = salary_info["avg"]
+            avg_salary = salary_info["avg"]
         
-        # Check employer
-        employer_id = v.get("employer", {}).get("id")
-        if employer_id == "666661":
-            pulkovo_salaries.append(avg_salary)
-        else:
-            market_salaries.append(avg_salary)
+            # Check employer
+            employer_id = v.get("employer", {}).get("id")
+            if employer_id == PULKOVO_EMPLOYER_ID:
+                pulkovo_salaries.append(avg_salary)
+            else:
+                market_salaries.append(avg_salary)
             
-        # Experience
-        exp_obj = v.get("experience", {})
-        exp_id = exp_obj.get("id", "noExperience")
-        exp_name = exp_obj.get("name", "Нет опыта")
-        exp_numeric = EXPERIENCE_MAP.get(exp_id, 0)
+            # Experience
+            exp_obj = v.get("experience", {})
+            exp_id = exp_obj.get("id", DEFAULT_EXPERIENCE_ID)
+            exp_name = exp_obj.get("name", DEFAULT_EXPERIENCE_LABEL)
+            exp_numeric = EXPERIENCE_MAP.get(exp_id, 0)
         
-        # Employment type
-        employment_obj = v.get("employment", {})
-        employment_name = employment_obj.get("name", "Не указано")
-        employment_values.append(employment_name)
+            # Employment type
+            employment_obj = v.get("employment", {})
+            employment_name = employment_obj.get("name", UNSPECIFIED_LABEL)
+            employment_values.append(employment_name)
         
-        # Schedule type
-        schedule_obj = v.get("schedule", {})
-        schedule_name = schedule_obj.get("name", "Не указано")
-        schedule_values.append(schedule_name)
+            # Schedule type
+            schedule_obj = v.get("schedule", {})
+            schedule_name = schedule_obj.get("name", UNSPECIFIED_LABEL)
+            schedule_values.append(schedule_name)
         
-        processed_vacancies.append(v)
-        salary_values.append(avg_salary)
-        experience_values.append(exp_name)
+            processed_vacancies.append(v)
+            salary_values.append(avg_salary)
+            experience_values.append(exp_name)
         
-        bubble_data.append({
-            "id": v.get("id"),
-            "salary": avg_salary,
-            "experience": exp_numeric,
-            "experience_label": exp_name,
-            "title": v.get("name")
-        })
+            bubble_data.append({
+                "id": v.get("id"),
+                "salary": avg_salary,
+                "experience": exp_numeric,
+                "experience_label": exp_name,
+                "title": v.get("name")
+            })
     
     return {
         "vacancies": processed_vacancies,
@@ -343,3 +410,77 @@ def parse_vacancies_for_role(vacancies: List[Dict[str, Any]],
         "schedule_values": schedule_values,
         "filter_stats": filter_stats
     }
+
+
+def parse_all_vacancies(vacancies: List[Dict[str, Any]],
+                        filter_outliers: bool = True) -> Dict[str, Any]:
+    """
+    Parse and process all vacancies with optional outlier filtering.
+    
+    Args:
+        vacancies: List of all vacancy items.
+        filter_outliers: Whether to filter out high and low salary outliers.
+        
+    Returns:
+        Dictionary containing processed vacancy data and statistics.
+        Includes 'filter_stats' with counts before/after filtering.
+    """
+    vacancies_to_process = vacancies
+    filter_stats = {
+        "total_before_filter": len(vacancies),
+        "filtered_high_count": 0,
+        "filtered_low_count": 0,
+        "filtered_total_count": 0,
+        "median_salary": None,
+        "high_threshold": None,
+        "low_threshold": None
+    }
+    
+    # Optionally filter salary outliers (both high and low)
+    if filter_outliers:
+        with stage_timer("outlier_filter"):
+            vacancies_to_process, outlier_stats = filter_salary_outliers(
+                vacancies, 
+                return_stats=True
+            )
+        filter_stats["filtered_high_count"] = outlier_stats["filtered_high_count"]
+        filter_stats["filtered_low_count"] = outlier_stats["filtered_low_count"]
+        filter_stats["filtered_total_count"] = outlier_stats["filtered_total_count"]
+        filter_stats["median_salary"] = outlier_stats["median"]
+        filter_stats["high_threshold"] = outlier_stats["high_threshold"]
+        filter_stats["low_threshold"] = outlier_stats["low_threshold"]
+    
+    salary_values = []
+    experience_values = []
+    employment_values = []
+    schedule_values = []
+    
+    with stage_timer("extraction"):
+        for v in vacancies_to_process:
+            salary_info = process_salary(v)
+            if salary_info:
+                salary_values.append(salary_info["avg"])
+        
+            # Experience
+            exp_obj = v.get("experience", {})
+            exp_name = exp_obj.get("name", UNSPECIFIED_LABEL)
+            experience_values.append(exp_name)
+        
+            # Employment type
+            employment_obj = v.get("employment", {})
+            employment_name = employment_obj.get("name", UNSPECIFIED_LABEL)
+            employment_values.append(employment_name)
+        
+            # Schedule type
+            schedule_obj = v.get("schedule", {})
+            schedule_name = schedule_obj.get("name", UNSPECIFIED_LABEL)
+            schedule_values.append(schedule_name)
+    
+    return {
+        "salary_values": salary_values,
+        "experience_values": experience_values,
+        "employment_values": employment_values,
+        "schedule_values": schedule_values,
+        "total_count": len(vacancies_to_process),
+        "filter_stats": filter_stats
+    }
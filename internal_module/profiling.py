@@ -0,0 +1,124 @@
+"""
+Profiling module for on-demand diagnostics of stats requests.
+Contains a lightweight sampling profiler producing flamegraph-compatible output.
+"""
+import hmac
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Optional, Tuple
+
+
+# Profiling is disabled unless a token is configured
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+
+# Optional directory where collected profiles are stored
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+
+# Sampling interval in seconds
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.001"))
+
+
+class StackSampler:
+    """
+    Sampling profiler for the thread that enters the context.
+
+    A background thread periodically captures the stack of the profiled thread
+    and counts identical stacks. The result is rendered in the collapsed
+    ("folded") format understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._target_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "StackSampler":
+        self._target_thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """
+        Render collected samples in the collapsed stack format.
+
+        Returns:
+            One line per unique stack: frames separated by ';' followed by the sample count.
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+def is_profiling_allowed(token: Optional[str]) -> bool:
+    """
+    Check whether a request may be profiled.
+
+    Args:
+        token: Token supplied by the client.
+
+    Returns:
+        True if profiling is enabled and the token matches.
+    """
+    if not PROFILING_TOKEN or not token:
+        return False
+    # Compare bytes: str comparison rejects non-ASCII header values with TypeError
+    return hmac.compare_digest(token.encode("utf-8"), PROFILING_TOKEN.encode("utf-8"))
+
+
+def profile_call(func: Callable[[], Any]) -> Tuple[Any, str]:
+    """
+    Run a callable under the sampling profiler.
+
+    Args:
+        func: Callable without arguments.
+
+    Returns:
+        Tuple of (result of func, collapsed stacks).
+    """
+    with StackSampler() as sampler:
+        result = func()
+    return result, sampler.collapsed()
+
+
+def save_profile(name: str, collapsed: str) -> Optional[str]:
+    """
+    Store a collapsed profile in PROFILE_DIR.
+
+    Args:
+        name: Short name describing the profiled request.
+        collapsed: Profile in the collapsed stack format.
+
+    Returns:
+        Path to the stored file, or None if PROFILE_DIR is not configured.
+    """
+    if not PROFILE_DIR:
+        return None
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    file_path = os.path.join(PROFILE_DIR, f"{name}_{timestamp}.folded")
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(collapsed)
+    return file_path
@@ -0,0 +1,382 @@
+"""
+Shared dataset module for multi-worker deployments.
+Contains a columnar, memory-mapped representation of the vacancies snapshot.
+
+The snapshot is converted once into numpy column files (ideally on a tmpfs
+such as /dev/shm). Every worker process attaches to these files read-only
+with np.load(mmap_mode="r"), so the data lives in the shared page cache once
+instead of being duplicated as Python objects in each worker.
+
+Workers call ensure_shared_dataset in the background: the first one builds
+the dataset under a file lock, the others wait for it and attach. The build
+is skipped when the dataset was already built from the same snapshot.
+It can also be prebuilt with:
+    python -m internal_module.shared_dataset --output /dev/shm/barometer_dataset
+"""
+import argparse
+import fcntl
+import json
+import os
+import shutil
+from typing import List, Dict, Optional, Any
+
+import numpy as np
+
+from internal_module.metrics import stage_timer
+from internal_module.parser import (
+    DATA_FILE,
+    EXPERIENCE_MAP,
+    PULKOVO_EMPLOYER_ID,
+    DEFAULT_EXPERIENCE_ID,
+    DEFAULT_EXPERIENCE_LABEL,
+    UNSPECIFIED_LABEL,
+    load_data,
+    process_salary,
+    resolve_data_file,
+    salary_outlier_flags,
+    salary_outlier_thresholds
+)
+from internal_module.warm_state import snapshot_fingerprint
+
+
+# Default location of the shared dataset
+SHARED_DATASET_DIR = os.environ.get("SHARED_DATASET_DIR")
+
+# Bump when the on-disk layout changes
+DATASET_VERSION = 1
+
+META_FILE = "meta.json"
+COLUMNS = ("salary_avg", "is_pulkovo", "experience", "employment", "schedule", "role_rows", "role_codes")
+
+
+class _Table:
+    """Assigns integer codes to unique JSON-serializable values."""
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: Any) -> int:
+        key = json.dumps(value, ensure_ascii=False, sort_keys=True)
+        if key not in self._codes:
+            self._codes[key] = len(self.values)
+            self.values.append(value)
+        return self._codes[key]
+
+
+def build_shared_dataset(vacancies: List[Dict[str, Any]], directory: str,
+                         fingerprint: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Convert vacancies into memory-mappable column files.
+
+    The dataset is written to a temporary directory first and then moved into
+    place, so workers never attach to a partially written dataset.
+
+    Args:
+        vacancies: List of vacancy items.
+        directory: Target directory for the column files.
+        fingerprint: Fingerprint of the source snapshot, stored to detect stale datasets.
+    """
+    experience_table = _Table()
+    employment_table = _Table()
+    schedule_table = _Table()
+    role_table = _Table()
+
+    count = len(vacancies)
+    salary_avg = np.full(count, np.nan, dtype=np.float64)
+    is_pulkovo = np.zeros(count, dtype=np.bool_)
+    experience = np.zeros(count, dtype=np.int32)
+    employment = np.zeros(count, dtype=np.int32)
+    schedule = np.zeros(count, dtype=np.int32)
+    role_rows = []
+    role_codes = []
+
+    for i, v in enumerate(vacancies):
+        salary_info = process_salary(v)
+        if salary_info:
+            salary_avg[i] = salary_info["avg"]
+
+        is_pulkovo[i] = v.get("employer", {}).get("id") == PULKOVO_EMPLOYER_ID
+
+        # Keep the raw objects so that readers apply the same defaults as the parser
+        experience[i] = experience_table.code(v.get("experience", {}))
+        employment[i] = employment_table.code(v.get("employment", {}))
+        schedule[i] = schedule_table.code(v.get("schedule", {}))
+
+        for role in v.get("professional_roles", []):
+            role_rows.append(i)
+            role_codes.append(role_table.code(role.get("id")))
+
+    columns = {
+        "salary_avg": salary_avg,
+        "is_pulkovo": is_pulkovo,
+        "experience": experience,
+        "employment": employment,
+        "schedule": schedule,
+        "role_rows": np.asarray(role_rows, dtype=np.int32),
+        "role_codes": np.asarray(role_codes, dtype=np.int32)
+    }
+    meta = {
+        "version": DATASET_VERSION,
+        "snapshot": fingerprint,
+        "count": count,
+        "experience": experience_table.values,
+        "employment": employment_table.values,
+        "schedule": schedule_table.values,
+        "role_ids": role_table.values
+    }
+
+    directory = os.path.abspath(directory)
+    tmp_directory = f"{directory}.{os.getpid()}.tmp"
+    os.makedirs(tmp_directory, exist_ok=True)
+    for name, column in columns.items():
+        np.save(os.path.join(tmp_directory, f"{name}.npy"), column)
+    with open(os.path.join(tmp_directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    # Attached workers keep their mappings of the old files until they exit
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.rename(tmp_directory, directory)
+
+
+class SharedDataset:
+    """
+    Read-only view of a dataset written by build_shared_dataset.
+
+    Produces the same intermediate data as parse_vacancies_for_role and
+    parse_all_vacancies, so the stats aggregation code is shared by both modes.
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != DATASET_VERSION:
+            raise ValueError(f"Unsupported shared dataset version: {meta.get('version')}")
+
+        self.directory = directory
+        self.count = meta["count"]
+        self.experience_objects = meta["experience"]
+        self.employment_objects = meta["employment"]
+        self.schedule_objects = meta["schedule"]
+        self.role_ids = meta["role_ids"]
+
+        columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS
+        }
+        self.salary_avg = columns["salary_avg"]
+        self.is_pulkovo = columns["is_pulkovo"]
+        self.experience = columns["experience"]
+        self.employment = columns["employment"]
+        self.schedule = columns["schedule"]
+        self.role_rows = columns["role_rows"]
+        self.role_codes = columns["role_codes"]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def nbytes(self) -> int:
+        """
+        Total size of the memory-mapped columns in bytes.
+        """
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    def _labels(self, codes: np.ndarray, objects: List[Dict[str, Any]], default: str) -> List[Any]:
+        names = [obj.get("name", default) for obj in objects]
+        return [names[code] for code in codes.tolist()]
+
+    def _filter_outliers(self, salaries: np.ndarray) -> Any:
+        """
+        Columnar equivalent of filter_salary_outliers for salaried vacancies.
+
+        Returns:
+            Tuple of (keep mask, filtered high count, filtered low count, median, high, low).
+        """
+        if not len(salaries):
+            return np.ones(0, dtype=np.bool_), 0, 0, None, None, None
+
+        median_salary, high_threshold, low_threshold = salary_outlier_thresholds(salaries)
+        high, low = salary_outlier_flags(salaries, high_threshold, low_threshold)
+        keep = ~(high | low)
+        return keep, int(high.sum()), int(low.sum()), median_salary, high_threshold, low_threshold
+
+    def parse_role(self, role_ids: set, filter_outliers: bool = True) -> Dict[str, Any]:
+        """
+        Columnar equivalent of parse_vacancies_for_role.
+
+        Bubble data only carries the fields used for aggregation and the raw
+        vacancies are not returned.
+
+        Args:
+            role_ids: Set of role IDs to filter by.
+            filter_outliers: Whether to filter out high and low salary outliers.
+
+        Returns:
+            Dictionary containing processed vacancy data and statistics.
+        """
+        with stage_timer("role_filter"):
+            codes = [code for code, role_id in enumerate(self.role_ids) if role_id in role_ids]
+            mask = np.zeros(self.count, dtype=np.bool_)
+            mask[self.role_rows[np.isin(self.role_codes, codes)]] = True
+            rows = np.flatnonzero(mask)
+
+        salaries = self.salary_avg[rows]
+        with_salary = ~np.isnan(salaries)
+
+        filter_stats = {
+            "total_before_filter": len(rows),
+            "filtered_count": 0,
+            "median_salary": None,
+            "threshold_salary": None
+        }
+
+        rows = rows[with_salary]
+        salaries = salaries[with_salary]
+
+        if filter_outliers:
+            with stage_timer("outlier_filter"):
+                keep, high_count, low_count, median_salary, high_threshold, _ = self._filter_outliers(salaries)
+            rows = rows[keep]
+            salaries = salaries[keep]
+            filter_stats["filtered_count"] = high_count + low_count
+            filter_stats["median_salary"] = median_salary
+            filter_stats["threshold_salary"] = high_threshold
+
+        is_pulkovo = self.is_pulkovo[rows]
+        experience_objects = [self.experience_objects[code] for code in self.experience[rows].tolist()]
+        experience_values = [obj.get("name", DEFAULT_EXPERIENCE_LABEL) for obj in experience_objects]
+        salary_values = salaries.tolist()
+
+        bubble_data = [
+            {
+                "salary": salary,
+                "experience": EXPERIENCE_MAP.get(obj.get("id", DEFAULT_EXPERIENCE_ID), 0),
+                "experience_label": label
+            }
+            for salary, obj, label in zip(salary_values, experience_objects, experience_values)
+        ]
+
+        return {
+            "pulkovo_salaries": salaries[is_pulkovo].tolist(),
+            "market_salaries": salaries[~is_pulkovo].tolist(),
+            "bubble_data": bubble_data,
+            "salary_values": salary_values,
+            "experience_values": experience_values,
+            "employment_values": self._labels(self.employment[rows], self.employment_objects, UNSPECIFIED_LABEL),
+            "schedule_values": self._labels(self.schedule[rows], self.schedule_objects, UNSPECIFIED_LABEL),
+            "filter_stats": filter_stats
+        }
+
+    def parse_all(self, filter_outliers: bool = True) -> Dict[str, Any]:
+        """
+        Columnar equivalent of parse_all_vacancies.
+
+        Args:
+            filter_outliers: Whether to filter out high and low salary outliers.
+
+        Returns:
+            Dictionary containing processed vacancy data and statistics.
+        """
+        filter_stats = {
+            "total_before_filter": self.count,
+            "filtered_high_count": 0,
+            "filtered_low_count": 0,
+            "filtered_total_count": 0,
+            "median_salary": None,
+            "high_threshold": None,
+            "low_threshold": None
+        }
+
+        rows = np.arange(self.count)
+
+        if filter_outliers:
+            with stage_timer("outlier_filter"):
+                with_salary = ~np.isnan(self.salary_avg)
+                salaried_rows = rows[with_salary]
+                keep, high_count, low_count, median_salary, high_threshold, low_threshold = \
+                    self._filter_outliers(self.salary_avg[salaried_rows])
+                # Same order as filter_salary_outliers: kept salaried vacancies, then those without salary
+                rows = np.concatenate([salaried_rows[keep], rows[~with_salary]])
+            filter_stats["filtered_high_count"] = high_count
+            filter_stats["filtered_low_count"] = low_count
+            filter_stats["filtered_total_count"] = high_count + low_count
+            filter_stats["median_salary"] = median_salary
+            filter_stats["high_threshold"] = high_threshold
+            filter_stats["low_threshold"] = low_threshold
+
+        salaries = self.salary_avg[rows]
+
+        return {
+            "salary_values": salaries[~np.isnan(salaries)].tolist(),
+            "experience_values": self._labels(self.experience[rows], self.experience_objects, UNSPECIFIED_LABEL),
+            "employment_values": self._labels(self.employment[rows], self.employment_objects, UNSPECIFIED_LABEL),
+            "schedule_values": self._labels(self.schedule[rows], self.schedule_objects, UNSPECIFIED_LABEL),
+            "total_count": len(rows),
+            "filter_stats": filter_stats
+        }
+
+
+def _read_meta(directory: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the metadata of a built dataset, or None if it is missing or outdated.
+    """
+    try:
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != DATASET_VERSION:
+        return None
+    return meta
+
+
+def ensure_shared_dataset(directory: Optional[str] = None,
+                          data_file: str = DATA_FILE) -> SharedDataset:
+    """
+    Attach to the shared dataset, building it first if it is missing or stale.
+
+    Builds are serialized with a file lock, so only one process parses the
+    snapshot while the others wait and then attach to the result.
+
+    Args:
+        directory: Optional dataset directory. Uses SHARED_DATASET_DIR if not provided.
+        data_file: Vacancies snapshot the dataset is built from.
+
+    Returns:
+        Read-only shared dataset.
+    """
+    directory = os.path.abspath(directory or SHARED_DATASET_DIR)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+
+    with open(f"{directory}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Fingerprint the file load_data actually reads, including its fallback
+            source_file = resolve_data_file(data_file)
+            fingerprint = snapshot_fingerprint(source_file) if source_file else None
+            meta = _read_meta(directory)
+            if meta is None or meta.get("snapshot") != fingerprint:
+                vacancies = load_data(data_file)
+                build_shared_dataset(vacancies, directory, fingerprint)
+                print(f"Built shared dataset with {len(vacancies)} vacancies in {directory}")
+            return SharedDataset(directory)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Build the shared vacancies dataset for multi-worker mode.")
+    arg_parser.add_argument("--output", default=SHARED_DATASET_DIR, help="Target directory (default: $SHARED_DATASET_DIR)")
+    arg_parser.add_argument("--data-file", default=DATA_FILE, help="Vacancies snapshot to convert")
+    args = arg_parser.parse_args()
+
+    if not args.output:
+        arg_parser.error("--output or SHARED_DATASET_DIR is required")
+
+    dataset = ensure_shared_dataset(args.output, args.data_file)
+    print(f"Shared dataset with {len(dataset)} vacancies is ready in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
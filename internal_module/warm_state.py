@@ -0,0 +1,129 @@
+"""
+Warm state module for fast service restarts.
+Contains functions for persisting and restoring precomputed stats aggregates.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+
+
+# Warm state file path
+WARM_STATE_FILE = os.environ.get(
+    "WARM_STATE_FILE",
+    os.path.join(os.path.dirname(__file__), "../final_folder/warm_state.json")
+)
+
+# Bump when the layout of cached aggregates changes
+WARM_STATE_VERSION = 1
+
+
+def snapshot_fingerprint(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Describe a snapshot file so that stale warm state can be detected.
+
+    Args:
+        file_path: Path to the vacancies snapshot.
+
+    Returns:
+        Dictionary with path, size and modification time, or None if the file is missing.
+    """
+    if not os.path.exists(file_path):
+        return None
+
+    stat = os.stat(file_path)
+    return {
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
+    }
+
+
+def code_fingerprint(file_paths: Iterable[str]) -> str:
+    """
+    Hash the source files that compute cached aggregates.
+
+    Any edit to these files changes the hash, so warm state built by older
+    code is discarded without a manual WARM_STATE_VERSION bump.
+
+    Args:
+        file_paths: Paths to the source files.
+
+    Returns:
+        Hex digest of the files' contents.
+    """
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_warm_state(fingerprint: Optional[Dict[str, Any]],
+                    file_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load cached aggregates if they were built from the same snapshot.
+
+    Args:
+        fingerprint: Fingerprint of the current snapshot.
+        file_path: Optional path to the warm state file. Uses default if not provided.
+
+    Returns:
+        Dictionary of cached aggregates, empty if the warm state is missing or stale.
+    """
+    target_file = file_path or WARM_STATE_FILE
+
+    if fingerprint is None or not os.path.exists(target_file):
+        return {}
+
+    try:
+        with open(target_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if state.get("version") != WARM_STATE_VERSION or state.get("snapshot") != fingerprint:
+        return {}
+
+    return state.get("aggregates", {})
+
+
+def save_warm_state(fingerprint: Optional[Dict[str, Any]],
+                    aggregates: Dict[str, Any],
+                    file_path: Optional[str] = None) -> bool:
+    """
+    Persist cached aggregates next to the snapshot they were built from.
+
+    The file is written atomically so that a concurrent reader never sees a partial state.
+
+    Args:
+        fingerprint: Fingerprint of the snapshot the aggregates were built from.
+        aggregates: JSON-serializable cached aggregates.
+        file_path: Optional path to the warm state file. Uses default if not provided.
+
+    Returns:
+        True if the warm state was written.
+    """
+    target_file = file_path or WARM_STATE_FILE
+
+    if fingerprint is None or not aggregates:
+        return False
+
+    state = {
+        "version": WARM_STATE_VERSION,
+        "snapshot": fingerprint,
+        "aggregates": aggregates
+    }
+
+    tmp_file = f"{target_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(target_file)), exist_ok=True)
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_file, target_file)
+    except OSError:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return False
+
+    return True
@@ -0,0 +1,87 @@
+"""
+Parity check between the in-memory parser and the memory-mapped shared dataset.
+Both paths must produce the same intermediate data for every role.
+"""
+import random
+
+import pytest
+
+from internal_module.parser import (
+    ROLES_CONFIG,
+    parse_all_vacancies,
+    parse_vacancies_for_role
+)
+from internal_module.shared_dataset import SharedDataset, build_shared_dataset
+
+
+BUBBLE_FIELDS = ("salary", "experience", "experience_label")
+
+
+def make_vacancies(count=2000, seed=1):
+    """Generate synthetic vacancies covering missing fields, currencies and salary modes."""
+    rng = random.Random(seed)
+    role_ids = sorted({str(i) for role in ROLES_CONFIG for i in role["ids"]}) + ["999"]
+    experiences = [
+        {"id": "noExperience", "name": "Нет опыта"},
+        {"id": "between1And3", "name": "От 1 года до 3 лет"},
+        {"id": "moreThan6", "name": "Более 6 лет"},
+        {"id": "unknown"},
+        {}
+    ]
+
+    vacancies = []
+    for i in range(count):
+        v = {
+            "id": str(i),
+            "name": f"Вакансия {i}",
+            "professional_roles": [{"id": rng.choice(role_ids)} for _ in range(rng.randint(0, 3))],
+            "employer": {"id": rng.choice(["666661", "1", "2"])}
+        }
+        if rng.random() < 0.7:
+            v["salary"] = {
+                "currency": rng.choice(["RUR"] * 5 + ["USD"]),
+                "from": rng.choice([None, rng.randint(1, 300) * 1000]),
+                "to": rng.choice([None, rng.randint(1, 300) * 1000])
+            }
+            if rng.random() < 0.2:
+                v["salary_range"] = {"mode": {"id": rng.choice(["SHIFT", "HOUR", "MONTH"])}}
+        if rng.random() < 0.9:
+            v["experience"] = rng.choice(experiences)
+        if rng.random() < 0.9:
+            v["employment"] = {"name": rng.choice(["Полная занятость", "Частичная занятость"])}
+        if rng.random() < 0.9:
+            v["schedule"] = {"name": rng.choice(["Полный день", "Сменный график", "Вахтовый метод"])}
+        vacancies.append(v)
+    return vacancies
+
+
+@pytest.fixture(scope="module")
+def datasets(tmp_path_factory):
+    vacancies = make_vacancies()
+    directory = tmp_path_factory.mktemp("shared") / "dataset"
+    build_shared_dataset(vacancies, str(directory))
+    return vacancies, SharedDataset(str(directory))
+
+
+@pytest.mark.parametrize("filter_outliers", [True, False])
+@pytest.mark.parametrize("role_index", range(len(ROLES_CONFIG)))
+def test_parse_role_matches_parser(datasets, role_index, filter_outliers):
+    vacancies, shared = datasets
+    role_ids = set(map(str, ROLES_CONFIG[role_index]["ids"]))
+
+    expected = parse_vacancies_for_role(vacancies, role_ids, filter_outliers=filter_outliers)
+    actual = shared.parse_role(role_ids, filter_outliers=filter_outliers)
+
+    expected["bubble_data"] = [{k: b[k] for k in BUBBLE_FIELDS} for b in expected["bubble_data"]]
+    del expected["vacancies"]
+    assert actual == expected
+
+
+@pytest.mark.parametrize("filter_outliers", [True, False])
+def test_parse_all_matches_parser(datasets, filter_outliers):
+    vacancies, shared = datasets
+
+    expected = parse_all_vacancies(vacancies, filter_outliers=filter_outliers)
+    actual = shared.parse_all(filter_outliers=filter_outliers)
+
+    assert actual == expected